@@ -5,9 +5,22 @@ const path = require('path');
 const { GoogleAdsApi } = require('google-ads-api');
 
 const app = express();
+
+// Health check: cuerpo precalculado y registrado antes de cualquier middleware.
+// Queda antes de cors() a propósito: lo consultan el balanceador y la propia página (mismo
+// origen), así que no necesita cabeceras CORS para peticiones de otros orígenes.
+const HEALTH_BODY = Buffer.from(JSON.stringify({ status: 'healthy', service: 'ads-device-tracker' }));
+
+app.get('/api/health', (req, res) => {
+  res.type('json').end(HEALTH_BODY);
+});
+
 app.use(cors());
 app.use(express.json());
 
+// Las respuestas de la API son POST: no calcular ETag (hash SHA-1 del cuerpo) en cada res.json
+app.set('etag', false);
+
 // Servir archivos estáticos desde /public
 app.use(express.static(path.join(__dirname, 'public')));
 
@@ -18,15 +31,115 @@ const client = new GoogleAdsApi({
   developer_token: process.env.DEVELOPER_TOKEN,
 });
 
+// Reutilizar una instancia de Customer por customerId en lugar de crearla en cada petición
+const CUSTOMER_ID_PATTERN = /^\d{10}$/;
+const CUSTOMERS_MAX_ENTRIES = 100;
+const customers = new Map();
+
+// Acepta número, '1234567890' o el formato de la UI '123-456-7890'; devuelve null si no es válido
+function normalizeCustomerId(customerId) {
+  if (customerId === undefined || customerId === null) return null;
+  const normalized = String(customerId).replace(/-/g, '');
+  return CUSTOMER_ID_PATTERN.test(normalized) ? normalized : null;
+}
+
+function getCustomer(customerId) {
+  let customer = customers.get(customerId);
+  if (customer) {
+    // Mover al final para que la expulsión sea LRU y no por orden de inserción
+    customers.delete(customerId);
+  } else {
+    customer = client.Customer({
+      customer_id: customerId,
+      refresh_token: process.env.REFRESH_TOKEN,
+    });
+    // Map conserva el orden de uso: al llenarse se descarta la entrada usada hace más tiempo
+    if (customers.size >= CUSTOMERS_MAX_ENTRIES) {
+      customers.delete(customers.keys().next().value);
+    }
+  }
+  customers.set(customerId, customer);
+  return customer;
+}
+
+// Caché en memoria de resultados de consultas (clave: customerId + texto de la consulta).
+// Se aceptan hasta 5 minutos de retraso también en rangos que incluyen hoy: los informes de
+// Google Ads ya llegan con horas de retraso. Cada entrada guarda un informe completo, así que
+// se limita por entradas y por filas totales.
+const QUERY_CACHE_TTL_MS = 5 * 60 * 1000;
+const QUERY_CACHE_MAX_ENTRIES = 20;
+const QUERY_CACHE_MAX_ROWS = 20000;
+const queryCache = new Map();
+let queryCacheRows = 0;
+
+function removeQuery(cacheKey) {
+  queryCacheRows -= queryCache.get(cacheKey).rows;
+  queryCache.delete(cacheKey);
+}
+
+// Se guarda la promesa en curso: peticiones simultáneas con la misma clave comparten una sola consulta
+async function cachedQuery(customerId, query) {
+  const cacheKey = `${customerId}|${query}`;
+  const cached = queryCache.get(cacheKey);
+  if (cached) {
+    if (cached.expires > Date.now()) return cached.promise;
+    removeQuery(cacheKey);
+  }
+
+  // Map conserva el orden de inserción: se descartan primero las entradas más antiguas
+  while (queryCache.size >= QUERY_CACHE_MAX_ENTRIES) {
+    removeQuery(queryCache.keys().next().value);
+  }
+
+  // Mientras está pendiente la entrada no cuenta filas ni caduca
+  const entry = { rows: 0, expires: Infinity };
+  entry.promise = getCustomer(customerId).query(query).then(
+    (results) => {
+      // La entrada pudo ser expulsada mientras la consulta estaba en curso
+      if (queryCache.get(cacheKey) !== entry) return results;
+
+      // Un informe que no cabe en el presupuesto no se guarda
+      if (results.length > QUERY_CACHE_MAX_ROWS) {
+        removeQuery(cacheKey);
+        return results;
+      }
+      for (const key of queryCache.keys()) {
+        if (queryCacheRows + results.length <= QUERY_CACHE_MAX_ROWS) break;
+        if (key !== cacheKey) removeQuery(key);
+      }
+      entry.rows = results.length;
+      entry.expires = Date.now() + QUERY_CACHE_TTL_MS;
+      queryCacheRows += entry.rows;
+      return results;
+    },
+    (error) => {
+      // Los errores no se cachean
+      if (queryCache.get(cacheKey) === entry) removeQuery(cacheKey);
+      throw error;
+    }
+  );
+  queryCache.set(cacheKey, entry);
+  return entry.promise;
+}
+
+const DATE_PATTERN = /^\d{4}-\d{2}-\d{2}$/;
+
+function isValidDate(date) {
+  return typeof date === 'string' && DATE_PATTERN.test(date);
+}
+
 // Endpoint para obtener datos de dispositivos
 app.post('/api/devices-data', async (req, res) => {
   try {
-    const { customerId, startDate, endDate } = req.body;
+    const { startDate, endDate } = req.body;
+    const customerId = normalizeCustomerId(req.body.customerId);
     
-    const customer = client.Customer({
-      customer_id: customerId,
-      refresh_token: process.env.REFRESH_TOKEN,
-    });
+    if (!customerId) {
+      return res.status(400).json({ success: false, error: 'customerId debe tener 10 dígitos (se admiten guiones)' });
+    }
+    if (!isValidDate(startDate) || !isValidDate(endDate)) {
+      return res.status(400).json({ success: false, error: 'startDate y endDate deben tener formato YYYY-MM-DD' });
+    }
 
     // Consulta para métricas de dispositivos
     const query = `
@@ -43,7 +156,7 @@ app.post('/api/devices-data', async (req, res) => {
       ORDER BY metrics.impressions DESC
     `;
 
-    const results = await customer.query(query);
+    const results = await cachedQuery(customerId, query);
     
     // Procesar datos
     const processedData = processGoogleAdsData(results);
@@ -66,12 +179,12 @@ app.post('/api/devices-data', async (req, res) => {
 // Endpoint para datos por ubicación
 app.post('/api/location-data', async (req, res) => {
   try {
-    const { customerId, locationType } = req.body;
+    const { locationType } = req.body;
+    const customerId = normalizeCustomerId(req.body.customerId);
     
-    const customer = client.Customer({
-      customer_id: customerId,
-      refresh_token: process.env.REFRESH_TOKEN,
-    });
+    if (!customerId) {
+      return res.status(400).json({ error: 'customerId debe tener 10 dígitos (se admiten guiones)' });
+    }
 
     const query = `
       SELECT
@@ -88,7 +201,7 @@ app.post('/api/location-data', async (req, res) => {
       LIMIT 100
     `;
 
-    const results = await customer.query(query);
+    const results = await cachedQuery(customerId, query);
     
     res.json({
       success: true,
@@ -150,6 +263,10 @@ app.get('*', (req, res) => {
 });
 
 const PORT = process.env.PORT || 3000;
-app.listen(PORT, () => {
+const server = app.listen(PORT, () => {
   console.log(`Servidor ejecutándose en puerto ${PORT}`);
-});
\ No newline at end of file
+});
+
+// Mantener vivas las conexiones más que el balanceador (por defecto Node cierra a los 5s)
+server.keepAliveTimeout = 65000;
+server.headersTimeout = 66000;
\ No newline at end of file